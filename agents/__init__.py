@@ -3,7 +3,7 @@
 AutoGen多代理系统包初始化文件。
 导出主要的代理类和工厂函数。
 """
-from .agent_factory import create_agents, SummarizationAgentTeam
+from .agent_factory import create_agents, get_team, SummarizationAgentTeam
 from .web_fetcher_agent import WebFetcherAgent
 from .content_processor_agent import ContentProcessorAgent
 from .summarizer_agent import SummarizerAgent
@@ -11,6 +11,7 @@ from .integrator_agent import IntegratorAgent
 
 __all__ = [
     'create_agents',
+    'get_team',
     'SummarizationAgentTeam',
     'WebFetcherAgent',
     'ContentProcessorAgent',
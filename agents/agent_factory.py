@@ -6,38 +6,75 @@
 
 from typing import Dict, Any, Optional, List
 import json
+import asyncio
+import functools
 from autogen import Agent, AssistantAgent, UserProxyAgent
 
 
-from config.config import DEFAULT_MODEL, DEEPSEEK_API_KEY, DEEPSEEK_API_BASE
+from config.config import (
+    DEFAULT_MODEL, DEEPSEEK_API_KEY, DEEPSEEK_API_BASE,
+    INTEGRATE_FAN_IN, INTEGRATE_THRESHOLD
+)
 from models.deepseek_client import create_deepseek_config
 from .web_fetcher_agent import WebFetcherAgent
 from .content_processor_agent import ContentProcessorAgent
 from .summarizer_agent import SummarizerAgent
 from .integrator_agent import IntegratorAgent
 from storage.summary_storage import SummaryStorage
+from storage.summary_cache import SummaryCache
+from .agent_utils import create_rate_limiter
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm_config() -> Dict[str, Any]:
+    """
+    获取DeepSeek LLM配置，配置只依赖环境变量，因此在进程内缓存复用
+    
+    Returns:
+        LLM配置字典
+    """
+    return create_deepseek_config(
+        model=DEFAULT_MODEL,
+        api_key=DEEPSEEK_API_KEY,
+        api_base=DEEPSEEK_API_BASE
+    )
 
 
 class SummarizationAgentTeam:
     """摘要生成代理团队，协调多个代理完成网页摘要生成任务"""
     
-    def __init__(self):
-        """初始化代理团队"""
-        # 创建DeepSeek LLM配置
-        self.llm_config = create_deepseek_config(
-            model=DEFAULT_MODEL,
-            api_key=DEEPSEEK_API_KEY,
-            api_base=DEEPSEEK_API_BASE
-        )
+    def __init__(self, shared: bool = False):
+        """
+        初始化代理团队
+        
+        Args:
+            shared: 是否为进程内共享的团队(见get_team)，共享的团队在close()时
+                只写入摘要索引，不关闭分块摘要缓存，以便之后继续使用
+        """
+        self.shared = shared
+        self._closed = False
+        
+        # 获取DeepSeek LLM配置
+        self.llm_config = _get_llm_config()
         
         # 存储管理器
         self.storage = SummaryStorage()
         
+        # 分块摘要缓存
+        self.summary_cache = SummaryCache()
+        
+        # API限流器，由摘要代理和整合代理共享
+        self.rate_limiter = create_rate_limiter()
+        
         # 初始化代理
         self.web_fetcher = WebFetcherAgent()
         self.content_processor = ContentProcessorAgent()
-        self.summarizer = SummarizerAgent(llm_config=self.llm_config)
-        self.integrator = IntegratorAgent(llm_config=self.llm_config)
+        self.summarizer = SummarizerAgent(
+            llm_config=self.llm_config,
+            rate_limiter=self.rate_limiter,
+            cache=self.summary_cache
+        )
+        self.integrator = IntegratorAgent(llm_config=self.llm_config, rate_limiter=self.rate_limiter)
         
         # 用户代理 - 充当整个系统的控制中心
         self.user_proxy = UserProxyAgent(
@@ -48,6 +85,22 @@ class SummarizationAgentTeam:
             code_execution_config={"work_dir": "workdir", "use_docker": False},
         )
     
+    def close(self):
+        """写入未保存的摘要索引并关闭分块摘要缓存，共享的团队只写入摘要索引"""
+        self.storage.flush()
+        # 进程池在下次批量获取时会重新创建，共享的团队也可以释放
+        self.web_fetcher.fetcher.close()
+        if self.shared or self._closed:
+            return
+        self.summary_cache.close()
+        self._closed = True
+    
+    def __enter__(self) -> "SummarizationAgentTeam":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     @staticmethod
     def _is_termination_msg(msg: Dict[str, Any]) -> bool:
         """判断是否终止对话的消息"""
@@ -57,6 +110,70 @@ class SummarizationAgentTeam:
                 return True
         return False
     
+    @staticmethod
+    def _extract_content(result: Any) -> str:
+        """
+        从代理返回结果中提取文本内容
+        
+        Args:
+            result: 代理返回的结果，可能是字符串、ChatResult对象或字典
+        
+        Returns:
+            文本内容
+        """
+        # 处理可能的各种返回类型
+        if isinstance(result, str):
+            return result
+        elif hasattr(result, 'content'):
+            return result.content
+        elif hasattr(result, 'message') and hasattr(result.message, 'content'):
+            return result.message.content
+        elif isinstance(result, dict) and 'content' in result:
+            return result['content']
+        return str(result)
+    
+    async def _integrate_group(self, summaries: List[str], url: str) -> str:
+        """
+        整合一组摘要，失败时退回到直接拼接
+        
+        Args:
+            summaries: 摘要列表
+            url: 原始网页URL
+        
+        Returns:
+            整合后的摘要
+        """
+        if len(summaries) == 1:
+            return summaries[0]
+        try:
+            integrated_obj = await self.integrator.integrate_summaries(summaries, url)
+            return self._extract_content(integrated_obj)
+        except Exception as e:
+            print(f"整合摘要时出错: {str(e)}")
+            return "\n\n".join(summaries)
+    
+    async def _tree_reduce(self, summaries: List[str], url: str) -> str:
+        """
+        分层整合摘要：每层将摘要按INTEGRATE_FAN_IN分组并发整合，直到只剩一个
+        
+        与一次性整合全部摘要相比，每次整合的提示长度有上限，不会超出模型上下文，
+        且同一层的整合请求可以并发执行
+        
+        Args:
+            summaries: 分块摘要列表
+            url: 原始网页URL
+        
+        Returns:
+            最终摘要
+        """
+        fan_in = max(2, INTEGRATE_FAN_IN)
+        while len(summaries) > 1:
+            groups = [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+            summaries = await asyncio.gather(
+                *(self._integrate_group(group, url) for group in groups)
+            )
+        return summaries[0]
+    
     async def start_summarization(self, url: str) -> str:
         """
         启动网页摘要生成流程
@@ -66,7 +183,13 @@ class SummarizationAgentTeam:
         
         Returns:
             生成的摘要内容
+        
+        Raises:
+            RuntimeError: 团队已关闭
         """
+        if self._closed:
+            raise RuntimeError("代理团队已关闭，请通过create_agents()或get_team()获取新的团队")
+        
         # 检查是否已有缓存的摘要
         cached_summary = self.storage.get_summary_by_url(url)
         if cached_summary:
@@ -82,51 +205,37 @@ class SummarizationAgentTeam:
             # 2. 处理内容，分块
             content_chunks = await self.content_processor.process_content(webpage_content)
             
-            # 3. 为每个块生成摘要
+            # 3. 并发为每个块生成摘要(并发数和速率由共享限流器控制)，
+            # 内容完全相同的块只请求一次，结果再分发回各自的位置
+            unique_chunks = list(dict.fromkeys(content_chunks))
+            print(f"正在并发处理 {len(content_chunks)} 个内容块(去重后 {len(unique_chunks)} 个)...")
+            unique_results = await asyncio.gather(
+                *(self.summarizer.generate_summary(chunk) for chunk in unique_chunks),
+                return_exceptions=True
+            )
+            result_by_chunk = dict(zip(unique_chunks, unique_results))
+            
             chunk_summaries = []
             for i, chunk in enumerate(content_chunks):
-                print(f"正在处理内容块 {i+1}/{len(content_chunks)}...")
-                try:
-                    summary_obj = await self.summarizer.generate_summary(chunk)
-                    # 处理可能的各种返回类型
-                    if isinstance(summary_obj, str):
-                        summary = summary_obj
-                    elif hasattr(summary_obj, 'content'):
-                        summary = summary_obj.content
-                    elif hasattr(summary_obj, 'message') and hasattr(summary_obj.message, 'content'):
-                        summary = summary_obj.message.content
-                    elif isinstance(summary_obj, dict) and 'content' in summary_obj:
-                        summary = summary_obj['content']
-                    else:
-                        summary = str(summary_obj)
-                    chunk_summaries.append(summary)
-                except Exception as e:
-                    print(f"处理块 {i+1} 时出错: {str(e)}")
+                summary_obj = result_by_chunk[chunk]
+                if isinstance(summary_obj, Exception):
+                    print(f"处理块 {i+1} 时出错: {str(summary_obj)}")
                     chunk_summaries.append(f"[块 {i+1} 处理错误]")
+                else:
+                    chunk_summaries.append(self._extract_content(summary_obj))
             
-            # 4. 整合摘要
-            if len(chunk_summaries) == 1:
-                final_summary = chunk_summaries[0]
+            # 4. 整合摘要：先按原顺序去除重复的摘要，摘要总量很小时直接拼接，
+            # 省去一次LLM调用，否则分层整合
+            unique_summaries = list(dict.fromkeys(chunk_summaries))
+            summary_tokens = self.content_processor.tokenizer.encode_ordinary_batch(unique_summaries)
+            if sum(len(tokens) for tokens in summary_tokens) < INTEGRATE_THRESHOLD:
+                final_summary = "\n\n".join(unique_summaries)
             else:
-                try:
-                    integrated_obj = await self.integrator.integrate_summaries(chunk_summaries, url)
-                    # 处理可能的各种返回类型
-                    if isinstance(integrated_obj, str):
-                        final_summary = integrated_obj
-                    elif hasattr(integrated_obj, 'content'):
-                        final_summary = integrated_obj.content
-                    elif hasattr(integrated_obj, 'message') and hasattr(integrated_obj.message, 'content'):
-                        final_summary = integrated_obj.message.content
-                    elif isinstance(integrated_obj, dict) and 'content' in integrated_obj:
-                        final_summary = integrated_obj['content']
-                    else:
-                        final_summary = str(integrated_obj)
-                except Exception as e:
-                    print(f"整合摘要时出错: {str(e)}")
-                    final_summary = "\n\n".join(chunk_summaries)
+                final_summary = await self._tree_reduce(unique_summaries, url)
             
-            # 5. 保存摘要
+            # 5. 保存摘要，并立即写入索引，使其他进程(如history、read命令)可以看到
             self.storage.save_summary(url, final_summary)
+            self.storage.flush()
             
             return final_summary
             
@@ -142,4 +251,17 @@ def create_agents() -> SummarizationAgentTeam:
     Returns:
         配置好的SummarizationAgentTeam实例
     """
-    return SummarizationAgentTeam()
\ No newline at end of file
+    return SummarizationAgentTeam()
+
+
+@functools.lru_cache(maxsize=1)
+def get_team() -> SummarizationAgentTeam:
+    """
+    获取进程内共享的代理团队，适用于在同一进程中处理多个URL的场景(如作为服务运行)，
+    避免为每个请求重复创建代理和LLM客户端。共享的团队可以用在with语句中，
+    退出时只写入摘要索引，不会关闭团队
+    
+    Returns:
+        共享的SummarizationAgentTeam实例
+    """
+    return SummarizationAgentTeam(shared=True)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+代理公用工具模块，提供摘要代理和整合代理共用的LLM请求逻辑。
+"""
+from typing import Optional
+from autogen import AssistantAgent
+
+from config.config import DEEPSEEK_QPM, DEEPSEEK_CONCURRENCY
+from utils.rate_limiter import AsyncRateLimiter
+
+
+def create_rate_limiter() -> AsyncRateLimiter:
+    """
+    按配置创建DeepSeek API限流器
+    
+    Returns:
+        API限流器
+    """
+    return AsyncRateLimiter(
+        max_rate=DEEPSEEK_QPM,
+        time_period=60,
+        max_concurrency=DEEPSEEK_CONCURRENCY
+    )
+
+
+async def ask_agent(agent: AssistantAgent, prompt: str, rate_limiter: AsyncRateLimiter) -> Optional[str]:
+    """
+    向代理发送单条提示并返回回复文本
+    
+    Args:
+        agent: 生成回复的代理
+        prompt: 提示内容
+        rate_limiter: API限流器
+    
+    Returns:
+        回复文本，代理未生成有效回复时返回None
+    """
+    # 直接请求代理生成回复，不经过临时用户代理，也不保留对话状态，
+    # 因此可以安全地并发调用
+    async with rate_limiter:
+        final, reply = await agent.a_generate_oai_reply(
+            messages=[{"role": "user", "content": prompt}]
+        )
+    
+    if isinstance(reply, dict):
+        reply = reply.get("content")
+    if final and reply:
+        return reply
+    return None
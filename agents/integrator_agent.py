@@ -1,8 +1,11 @@
 """
 摘要整合代理，整合多个摘要块成为一个连贯的完整摘要。
 """
-from typing import List, Dict, Any
-from autogen import AssistantAgent, UserProxyAgent
+from typing import List, Dict, Any, Optional
+from autogen import AssistantAgent
+
+from utils.rate_limiter import AsyncRateLimiter
+from .agent_utils import create_rate_limiter, ask_agent
 
 
 class IntegratorAgent:
@@ -10,13 +13,17 @@ class IntegratorAgent:
     摘要整合代理，负责将多个分块摘要整合成一个连贯的完整摘要
     """
     
-    def __init__(self, llm_config: Dict[str, Any]):
+    def __init__(self, llm_config: Dict[str, Any], rate_limiter: Optional[AsyncRateLimiter] = None):
         """
         初始化摘要整合代理
         
         Args:
             llm_config: LLM配置
+            rate_limiter: API限流器，多个代理共享同一限流器时共同遵守速率限制；
+                为None时创建独立的限流器
         """
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        
         self.agent = AssistantAgent(
             name="integrator",
             system_message="""你是一个专业的文本整合专家。你的任务是将多个相关的文本摘要整合成一个连贯、全面的完整摘要。
@@ -45,15 +52,6 @@ class IntegratorAgent:
         Returns:
             整合后的完整摘要
         """
-        from autogen.agentchat import UserProxyAgent
-        
-        # 创建一个临时的用户代理来与整合代理交互
-        user_proxy = UserProxyAgent(
-            name="user",
-            human_input_mode="NEVER",
-            max_consecutive_auto_reply=0
-        )
-        
         # 构建提示
         prompt = f"""下面是来自同一网页({url})的多个部分摘要。请将它们整合成一个连贯、全面的完整摘要：
 
@@ -65,13 +63,8 @@ class IntegratorAgent:
 请整合上述摘要块，创建一个连贯、全面且不重复的完整摘要。直接输出整合后的摘要内容，不要包含诸如"以下是整合后的摘要"等元描述。
 """
         
-        # 发送请求并获取回复
-        await user_proxy.initiate_chat(self.agent, message=prompt)
-        
-        # 获取整合后的摘要(最后一条消息)
-        messages = user_proxy.chat_messages[self.agent.name]
-        if messages:
-            integrated_summary = messages[-1]["content"]
-            return integrated_summary
+        reply = await ask_agent(self.agent, prompt, self.rate_limiter)
+        if reply:
+            return reply
         
         return "无法整合摘要。"
\ No newline at end of file
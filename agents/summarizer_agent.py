@@ -1,8 +1,15 @@
 """
 摘要生成代理，使用DeepSeek API生成文本摘要。
 """
+import asyncio
+import hashlib
 from typing import Dict, Any, Optional
-from autogen import AssistantAgent, UserProxyAgent
+from autogen import AssistantAgent
+
+from config.config import DEFAULT_MODEL
+from storage.summary_cache import SummaryCache
+from utils.rate_limiter import AsyncRateLimiter
+from .agent_utils import create_rate_limiter, ask_agent
 
 
 class SummarizerAgent:
@@ -10,13 +17,25 @@ class SummarizerAgent:
     摘要生成代理，负责对文本内容生成摘要
     """
     
-    def __init__(self, llm_config: Dict[str, Any]):
+    def __init__(
+        self,
+        llm_config: Dict[str, Any],
+        rate_limiter: Optional[AsyncRateLimiter] = None,
+        cache: Optional[SummaryCache] = None
+    ):
         """
         初始化摘要生成代理
         
         Args:
             llm_config: LLM配置
+            rate_limiter: API限流器，多个代理共享同一限流器时共同遵守速率限制；
+                为None时创建独立的限流器
+            cache: 分块摘要缓存，为None时使用默认位置的缓存，由本代理负责关闭
         """
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        self._owns_cache = cache is None
+        self.cache = cache or SummaryCache()
+        
         self.agent = AssistantAgent(
             name="summarizer",
             system_message="""你是一个专业的文本摘要专家。你的任务是生成准确、全面、连贯的内容摘要。
@@ -34,6 +53,11 @@ class SummarizerAgent:
             llm_config=llm_config
         )
     
+    def close(self):
+        """关闭由本代理创建的摘要缓存"""
+        if self._owns_cache:
+            self.cache.close()
+    
     async def generate_summary(self, content: str) -> str:
         """
         为给定内容生成摘要
@@ -44,14 +68,11 @@ class SummarizerAgent:
         Returns:
             生成的摘要文本
         """
-        from autogen.agentchat import UserProxyAgent
-        
-        # 创建一个临时的用户代理来与摘要代理交互
-        user_proxy = UserProxyAgent(
-            name="user",
-            human_input_mode="NEVER",
-            max_consecutive_auto_reply=0
-        )
+        # 相同模型、相同内容直接返回缓存的摘要；缓存读写是阻塞的磁盘操作，放到线程中执行
+        cache_key = hashlib.sha256(f"{DEFAULT_MODEL}\0{content}".encode('utf-8')).digest()
+        cached_summary = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached_summary is not None:
+            return cached_summary
         
         # 构建提示
         prompt = f"""请为以下内容生成一个全面、准确的摘要：
@@ -62,13 +83,9 @@ class SummarizerAgent:
 
 请直接输出摘要内容，不要包含诸如"以下是摘要"等元描述。"""
         
-        # 发送请求并获取回复
-        await user_proxy.initiate_chat(self.agent, message=prompt)
-        
-        # 获取摘要文本(最后一条消息)
-        messages = user_proxy.chat_messages[self.agent.name]
-        if messages:
-            summary = messages[-1]["content"]
-            return summary
+        reply = await ask_agent(self.agent, prompt, self.rate_limiter)
+        if reply:
+            await asyncio.to_thread(self.cache.put, cache_key, reply)
+            return reply
         
         return "无法生成摘要。"
\ No newline at end of file
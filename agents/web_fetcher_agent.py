@@ -3,12 +3,16 @@
 网页获取代理，负责调用WebpageContentFetcher获取和存储网页内容。
 """
 import os
+import gzip
+import json
+import asyncio
 import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
 from web_content.webpage_content_fetcher import WebpageContentFetcher
 from config.config import WEBPAGE_CONTENT_DIR
+from utils.json_utils import json_loads, json_dumps
 
 
 class WebFetcherAgent:
@@ -21,17 +25,53 @@ class WebFetcherAgent:
         self.content_dir = Path(WEBPAGE_CONTENT_DIR)
         self.content_dir.mkdir(parents=True, exist_ok=True)
         self.fetcher = WebpageContentFetcher()
-        self.content_index_file = self.content_dir / "content_index.json"
+        # 内容索引为只追加的NDJSON日志，每行记录一个URL到文件的映射
+        self.content_index_file = self.content_dir / "content_index.ndjson"
+        
+        # 保证进程内对索引的写入串行执行。锁绑定到首次使用它的事件循环，
+        # 事件循环变化(如多次调用asyncio.run)时重新创建
+        self._index_lock: Optional[asyncio.Lock] = None
+        self._index_lock_loop: Optional[asyncio.AbstractEventLoop] = None
         
         # 确保索引文件存在
         if not self.content_index_file.exists():
             self._init_content_index()
+        
+        # 内存中的URL到内容文件的映射，由索引日志回放得到
+        self._content_index = self._load_content_index()
     
     def _init_content_index(self):
         """初始化内容索引文件"""
-        import json
-        with open(self.content_index_file, 'w', encoding='utf-8') as f:
-            json.dump({}, f)
+        self.content_index_file.touch()
+    
+    def _load_content_index(self) -> Dict[str, str]:
+        """
+        加载内容索引，逐行回放日志，同一URL以最后一条记录为准
+        
+        Returns:
+            内容索引字典，键为URL，值为相对于内容目录的文件路径
+        """
+        index = {}
+        try:
+            with open(self.content_index_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json_loads(line)
+                    except json.JSONDecodeError:
+                        # 跳过写入中断导致的不完整行
+                        continue
+                    index[entry['url']] = entry['path']
+        except FileNotFoundError:
+            pass
+        return index
+    
+    def _get_index_lock(self) -> asyncio.Lock:
+        """获取当前事件循环的索引写入锁"""
+        loop = asyncio.get_running_loop()
+        if self._index_lock_loop is not loop:
+            self._index_lock_loop = loop
+            self._index_lock = asyncio.Lock()
+        return self._index_lock
     
     def _get_content_path(self, url: str) -> Path:
         """
@@ -43,29 +83,48 @@ class WebFetcherAgent:
         Returns:
             对应的文件路径
         """
-        # 使用URL的MD5哈希作为文件名
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        return self.content_dir / f"{url_hash}.txt"
+        # 使用URL的BLAKE2b哈希作为文件名(仅用于命名，比MD5更快)
+        url_hash = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+        return self.content_dir / f"{url_hash}.txt.gz"
+    
+    @staticmethod
+    def _read_content(content_path: Path) -> str:
+        """读取缓存的网页内容(gzip压缩)"""
+        with gzip.open(content_path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    
+    @staticmethod
+    def _write_content(content_path: Path, content: str):
+        """将网页内容以gzip压缩写入缓存文件"""
+        # 先写临时文件再替换，避免中断时留下损坏的压缩文件
+        tmp_path = content_path.with_suffix('.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(content)
+        os.replace(tmp_path, content_path)
     
-    def _update_content_index(self, url: str, file_path: Path):
+    def _append_content_index(self, url: str, file_path: Path):
         """
-        更新内容索引
+        向内容索引日志追加一条记录
         
         Args:
             url: 网页URL
             file_path: 内容文件路径
         """
-        import json
-        try:
-            with open(self.content_index_file, 'r', encoding='utf-8') as f:
-                index = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            index = {}
-        
-        index[url] = str(file_path.relative_to(self.content_dir))
+        entry = {'url': url, 'path': str(file_path.relative_to(self.content_dir))}
+        with open(self.content_index_file, 'ab') as f:
+            f.write(json_dumps(entry) + b'\n')
+    
+    async def _update_content_index(self, url: str, file_path: Path):
+        """
+        更新内容索引
         
-        with open(self.content_index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+        Args:
+            url: 网页URL
+            file_path: 内容文件路径
+        """
+        async with self._get_index_lock():
+            await asyncio.to_thread(self._append_content_index, url, file_path)
+        self._content_index[url] = str(file_path.relative_to(self.content_dir))
     
     async def fetch_webpage(self, url: str) -> Optional[str]:
         """
@@ -77,28 +136,44 @@ class WebFetcherAgent:
         Returns:
             网页内容文本，如果获取失败则返回None
         """
-        content_path = self._get_content_path(url)
+        # 优先使用索引中记录的文件，未记录时(如由其他进程抓取)按URL哈希推算
+        relative_path = self._content_index.get(url)
+        content_path = self.content_dir / relative_path if relative_path else self._get_content_path(url)
         
         # 检查是否已经有缓存
         if content_path.exists():
             print(f"找到缓存的网页内容: {content_path}")
-            with open(content_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return await asyncio.to_thread(self._read_content, content_path)
         
         # 没有缓存，需要抓取
         print(f"正在获取网页内容: {url}")
         try:
-            content = self.fetcher.fetch(url)
+            # 网络请求和磁盘读写都是阻塞操作，放到线程中执行以免阻塞事件循环
+            content = await self.fetcher.afetch(url)
             
             # 保存内容到文件
-            with open(content_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            await asyncio.to_thread(self._write_content, content_path, content)
             
             # 更新索引
-            self._update_content_index(url, content_path)
+            await self._update_content_index(url, content_path)
             
             return content
             
         except Exception as e:
             print(f"获取网页内容失败: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    async def fetch_webpages(self, urls: List[str]) -> List[Optional[str]]:
+        """
+        并发获取多个网页的内容，重复的URL只获取一次
+        
+        Args:
+            urls: 网页URL列表
+        
+        Returns:
+            与urls一一对应的网页内容列表，获取失败的位置为None
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        contents = await asyncio.gather(*(self.fetch_webpage(url) for url in unique_urls))
+        content_by_url = dict(zip(unique_urls, contents))
+        return [content_by_url[url] for url in urls]
\ No newline at end of file
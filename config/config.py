@@ -38,6 +38,12 @@ DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "deepseek-chat")  # 默认使用的DeepSeek模型
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "8192"))  # 单次API调用的最大token数
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "6000"))  # 内容分块大小，单位为token
+INTEGRATE_FAN_IN = int(os.getenv("INTEGRATE_FAN_IN", "4"))  # 分层整合时每次整合的最大摘要数
+INTEGRATE_THRESHOLD = int(os.getenv("INTEGRATE_THRESHOLD", "800"))  # 分块摘要总token数低于此值时直接拼接，不调用整合代理
+
+# API限流配置
+DEEPSEEK_QPM = int(os.getenv("DEEPSEEK_QPM", "500"))  # 每分钟最大请求数
+DEEPSEEK_CONCURRENCY = int(os.getenv("DEEPSEEK_CONCURRENCY", "20"))  # 同时进行的最大请求数
 
 # 功能配置
 SUMMARY_PREFIX = "## 网页内容摘要：\n\n"
\ No newline at end of file
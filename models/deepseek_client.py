@@ -5,9 +5,14 @@ DeepSeek API客户端，处理与DeepSeek API的交互。
 from typing import Dict, Any, Optional, List, Union
 import json
 import os
+import sys
 import time
+import random
+import asyncio
 from autogen.oai.client import OpenAIWrapper
 
+from config.config import DEBUG
+
 
 class DeepSeekModelClient:
     """
@@ -52,28 +57,27 @@ class DeepSeekModelClient:
             }]
         )
         
-    def generate(
-        self, 
+    @staticmethod
+    def _build_params(
         messages: List[Dict[str, str]],
-        temperature: float = 0.7,
-        max_tokens: Optional[int] = None,
-        stream: bool = False,
+        temperature: float,
+        max_tokens: Optional[int],
+        stream: bool,
         **kwargs
     ) -> Dict[str, Any]:
         """
-        生成文本响应
+        构建API请求参数
         
         Args:
             messages: 对话消息列表
-            temperature: 采样温度，控制输出的随机性
+            temperature: 采样温度
             max_tokens: 生成的最大token数
             stream: 是否使用流式输出
             **kwargs: 其他传递给API的参数
         
         Returns:
-            API响应
+            API参数
         """
-        # 准备参数
         params = {
             "messages": messages,
             "temperature": temperature,
@@ -85,6 +89,52 @@ class DeepSeekModelClient:
             
         # 添加其他参数
         params.update(kwargs)
+        return params
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        计算重试前的等待时间：优先遵循服务端的Retry-After，
+        否则使用带随机抖动的指数退避，避免大量请求同时重试
+        
+        Args:
+            attempt: 当前尝试序号(从0开始)
+            error: 本次调用抛出的异常
+        
+        Returns:
+            等待时间(秒)
+        """
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        
+        return min(60, self.retry_wait * (2 ** attempt)) + random.uniform(0, 0.5)
+    
+    def generate(
+        self, 
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        生成文本响应
+        
+        Args:
+            messages: 对话消息列表
+            temperature: 采样温度，控制输出的随机性
+            max_tokens: 生成的最大token数
+            stream: 是否使用流式输出
+            **kwargs: 其他传递给API的参数
+        
+        Returns:
+            API响应
+        """
+        params = self._build_params(messages, temperature, max_tokens, stream, **kwargs)
         
         # 尝试请求，带重试机制
         for attempt in range(self.max_retries):
@@ -95,8 +145,47 @@ class DeepSeekModelClient:
                     return self._generate_sync(params)
             except Exception as e:
                 if attempt < self.max_retries - 1:
-                    print(f"API调用失败，{self.retry_wait}秒后重试: {str(e)}")
-                    time.sleep(self.retry_wait)
+                    delay = self._retry_delay(attempt, e)
+                    print(f"API调用失败，{delay:.1f}秒后重试: {str(e)}")
+                    time.sleep(delay)
+                else:
+                    raise Exception(f"DeepSeek API调用失败: {str(e)}")
+    
+    async def a_generate(
+        self, 
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步生成文本响应，请求在线程中执行，重试等待不会阻塞事件循环
+        
+        Args:
+            messages: 对话消息列表
+            temperature: 采样温度，控制输出的随机性
+            max_tokens: 生成的最大token数
+            stream: 是否使用流式输出
+            **kwargs: 其他传递给API的参数
+        
+        Returns:
+            API响应
+        """
+        params = self._build_params(messages, temperature, max_tokens, stream, **kwargs)
+        
+        # 尝试请求，带重试机制
+        for attempt in range(self.max_retries):
+            try:
+                if stream:
+                    return await asyncio.to_thread(self._generate_stream, params)
+                else:
+                    return await asyncio.to_thread(self._generate_sync, params)
+            except Exception as e:
+                if attempt < self.max_retries - 1:
+                    delay = self._retry_delay(attempt, e)
+                    print(f"API调用失败，{delay:.1f}秒后重试: {str(e)}")
+                    await asyncio.sleep(delay)
                 else:
                     raise Exception(f"DeepSeek API调用失败: {str(e)}")
     
@@ -130,7 +219,10 @@ class DeepSeekModelClient:
         Returns:
             生成的完整文本
         """
-        full_response = ""
+        # 用列表收集流式片段，最后一次性拼接
+        parts = []
+        # 调试模式下实时回显输出，攒够一批片段再写入，减少终端写入次数
+        pending = []
         for chunk in self.client.create(
             messages=params["messages"],
             model=self.model,
@@ -142,11 +234,20 @@ class DeepSeekModelClient:
             if chunk and "choices" in chunk and chunk["choices"]:
                 content = chunk["choices"][0].get("delta", {}).get("content", "")
                 if content:
-                    full_response += content
-                    print(content, end="", flush=True)
+                    parts.append(content)
+                    if DEBUG:
+                        pending.append(content)
+                        if len(pending) >= 64:
+                            sys.stdout.write("".join(pending))
+                            sys.stdout.flush()
+                            pending.clear()
+        
+        if DEBUG:
+            pending.append("\n")  # 添加换行符
+            sys.stdout.write("".join(pending))
+            sys.stdout.flush()
         
-        print()  # 添加换行符
-        return full_response
+        return "".join(parts)
 
 
 def create_deepseek_config(
@@ -36,11 +36,10 @@ def summarize(url):
     click.echo(f"正在处理网页: {url}")
    
     try:
-        # 创建代理组
-        agents = create_agents()
-       
-        # 启动摘要过程
-        result_obj = asyncio.run(agents.start_summarization(url))
+        # 创建代理组，用完后关闭
+        with create_agents() as agents:
+            # 启动摘要过程
+            result_obj = asyncio.run(agents.start_summarization(url))
         
         # 处理可能的ChatResult对象或其他类型
         if hasattr(result_obj, 'content'):
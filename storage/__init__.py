@@ -4,8 +4,10 @@
 导出主要的存储管理类和函数。
 """
 from .summary_storage import SummaryStorage, SummaryMetadata
+from .summary_cache import SummaryCache
 
 __all__ = [
     'SummaryStorage',
-    'SummaryMetadata'
+    'SummaryMetadata',
+    'SummaryCache'
 ]
\ No newline at end of file
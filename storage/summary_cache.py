@@ -0,0 +1,63 @@
+"""
+摘要缓存模块，按内容哈希持久化缓存LLM生成的分块摘要。
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from config.config import SUMMARY_CONTENT_DIR
+
+
+class SummaryCache:
+    """
+    分块摘要缓存，使用SQLite存储内容哈希到摘要文本的映射
+    """
+    
+    def __init__(self, cache_file: Optional[str] = None):
+        """
+        初始化摘要缓存
+        
+        Args:
+            cache_file: 缓存数据库文件路径，如果为None则使用摘要存储目录下的默认文件
+        """
+        self.cache_file = Path(cache_file or Path(SUMMARY_CONTENT_DIR) / "summary_cache.db")
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # 连接可能在创建它的线程之外使用(如通过asyncio.to_thread访问)，由锁保证同一时刻只有一个线程使用
+        self._conn = sqlite3.connect(str(self.cache_file), check_same_thread=False)
+        self._lock = threading.Lock()
+        # WAL模式允许多个进程同时读写缓存
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (k BLOB PRIMARY KEY, v TEXT)")
+    
+    def get(self, key: bytes) -> Optional[str]:
+        """
+        读取缓存的摘要
+        
+        Args:
+            key: 缓存键(内容哈希)
+        
+        Returns:
+            缓存的摘要文本，如果未命中则返回None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT v FROM cache WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def put(self, key: bytes, value: str):
+        """
+        写入摘要缓存
+        
+        Args:
+            key: 缓存键(内容哈希)
+            value: 摘要文本
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cache (k, v) VALUES (?, ?)", (key, value))
+    
+    def close(self):
+        """关闭缓存数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -7,11 +7,58 @@ import json
 import time
 import uuid
 import hashlib
+import weakref
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Union, TypedDict
+from typing import Dict, Any, List, Optional, Tuple, Union, TypedDict
 
-from config.config import SUMMARY_CONTENT_DIR
+from config.config import SUMMARY_CONTENT_DIR, DEBUG
+from utils.json_utils import json_loads, json_dumps
+
+# 生成预览时将换行、回车和制表符替换为空格
+_PREVIEW_TRANS = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+
+def _read_index_file(index_file: Path) -> Dict[str, "SummaryMetadata"]:
+    """读取索引文件，文件不存在或损坏时返回空索引"""
+    try:
+        with open(index_file, 'rb') as f:
+            return json_loads(f.read())
+    except (json.JSONDecodeError, FileNotFoundError):
+        return {}
+
+
+def _write_index_file(index_file: Path, index: Dict[str, "SummaryMetadata"]):
+    """写入索引文件"""
+    # 一次编码、一次写入；缩进会成倍增加编码量和文件大小，仅在调试模式下使用。
+    # 先写入临时文件并落盘，再原子替换，避免中断时留下损坏的索引
+    tmp_file = index_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(json_dumps(index, indent=DEBUG))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, index_file)
+
+
+def _apply_pending(index: Dict[str, "SummaryMetadata"], pending: Dict[str, Optional["SummaryMetadata"]]):
+    """将未写盘的修改叠加到索引上，值为None的URL表示删除"""
+    for url, metadata in pending.items():
+        if metadata is None:
+            index.pop(url, None)
+        else:
+            index[url] = metadata
+
+
+def _flush_pending(index_file: Path, pending: Dict[str, Optional["SummaryMetadata"]]):
+    """
+    实例被回收或进程退出时写入未写盘的修改。只接收索引文件路径和修改字典，
+    不引用实例本身，因此不会延长实例的生命周期
+    """
+    if pending:
+        index = _read_index_file(index_file)
+        _apply_pending(index, pending)
+        _write_index_file(index_file, index)
+        pending.clear()
 
 
 class SummaryMetadata(TypedDict):
@@ -28,12 +75,14 @@ class SummaryStorage:
     摘要存储管理类，负责处理摘要的保存和检索
     """
     
-    def __init__(self, storage_dir: Optional[str] = None):
+    def __init__(self, storage_dir: Optional[str] = None, flush_interval: float = 5.0):
         """
         初始化摘要存储管理器
         
         Args:
             storage_dir: 摘要存储目录路径，如果为None则使用配置中的默认路径
+            flush_interval: 写盘后的这段时间(秒)内的修改合并延迟写入，由下一次超出间隔的修改、
+                flush()、实例被回收或进程退出时写入；为0时每次修改都立即写盘
         """
         self.storage_dir = Path(storage_dir or SUMMARY_CONTENT_DIR)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
@@ -41,14 +90,32 @@ class SummaryStorage:
         # 摘要索引文件
         self.index_file = self.storage_dir / "summary_index.json"
         
+        # 内存中的索引缓存，以及加载时索引文件的(修改时间, 大小)，
+        # 文件被其他进程修改后会重新加载
+        self._index: Optional[Dict[str, SummaryMetadata]] = None
+        self._index_stamp: Optional[Tuple[int, int]] = None
+        
+        # 摘要ID到URL的反向索引，随内存索引一起重建
+        self._id_to_url: Dict[str, str] = {}
+        
+        # 未写盘的修改，键为URL，值为新的元数据(删除时为None)，由flush()写入。
+        # 单独记录修改而不是整体覆盖索引文件，写盘时合并到磁盘上的最新索引，
+        # 不会覆盖其他进程在此期间写入的条目
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Optional[SummaryMetadata]] = {}
+        # 距上次写盘超过flush_interval后的第一次修改立即写盘，因此单独一次修改不会被推迟
+        self._last_flush = float('-inf')
+        # 实例被回收或进程退出时写入剩余的修改
+        weakref.finalize(self, _flush_pending, self.index_file, self._pending)
+        
         # 初始化索引文件(如果不存在)
         self._init_index_file()
     
     def _init_index_file(self):
         """初始化索引文件"""
         if not self.index_file.exists():
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
+            with open(self.index_file, 'wb') as f:
+                f.write(json_dumps({}))
     
     def _load_index(self) -> Dict[str, SummaryMetadata]:
         """
@@ -57,11 +124,34 @@ class SummaryStorage:
         Returns:
             摘要索引字典，键为URL，值为摘要元数据
         """
+        stamp = self._get_index_stamp()
+        if self._index is not None and stamp == self._index_stamp:
+            return self._index
+        
+        self._index = _read_index_file(self.index_file)
+        self._index_stamp = stamp
+        
+        # 索引文件被其他进程修改后重新加载，再叠加本实例未写盘的修改
+        _apply_pending(self._index, self._pending)
+        self._rebuild_id_index()
+        return self._index
+    
+    def _rebuild_id_index(self):
+        """根据内存中的索引重建摘要ID到URL的反向索引"""
+        self._id_to_url = {metadata['id']: url for url, metadata in self._index.items()}
+    
+    def _get_index_stamp(self) -> Optional[Tuple[int, int]]:
+        """
+        获取索引文件的(修改时间, 大小)，用于判断内存中的索引是否过期
+        
+        Returns:
+            (st_mtime_ns, st_size)，文件不存在时返回None
+        """
         try:
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
+            st = self.index_file.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
     
     def _save_index(self, index: Dict[str, SummaryMetadata]):
         """
@@ -70,8 +160,35 @@ class SummaryStorage:
         Args:
             index: 摘要索引字典
         """
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+        _write_index_file(self.index_file, index)
+        self._index = index
+        self._index_stamp = self._get_index_stamp()
+        self._rebuild_id_index()
+    
+    def _mark_dirty(self, url: str, metadata: Optional[SummaryMetadata]):
+        """
+        记录一条未写盘的索引修改，距上次写盘超过flush_interval时立即写盘
+        
+        Args:
+            url: 被修改的URL
+            metadata: 新的元数据，删除时为None
+        """
+        self._pending[url] = metadata
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        """将未写盘的索引修改合并到磁盘上的最新索引并写入索引文件"""
+        if self._pending:
+            self._save_index(self._load_index())
+            self._pending.clear()
+        self._last_flush = time.monotonic()
+    
+    def __enter__(self) -> "SummaryStorage":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
     
     def _get_summary_path(self, summary_id: str) -> Path:
         """
@@ -95,8 +212,8 @@ class SummaryStorage:
         Returns:
             摘要ID
         """
-        # 使用URL的MD5哈希前8位作为ID前缀
-        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
+        # 使用URL的4字节BLAKE2b哈希(8位十六进制)作为ID前缀
+        url_hash = hashlib.blake2b(url.encode(), digest_size=4).hexdigest()
         # 添加时间戳和随机元素
         unique_id = f"{url_hash}-{int(time.time())}-{uuid.uuid4().hex[:4]}"
         return unique_id
@@ -133,7 +250,7 @@ class SummaryStorage:
         # 更新索引
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         timestamp_unix = time.time()
-        preview = content[:200].replace("\n", " ")
+        preview = content[:200].translate(_PREVIEW_TRANS)
         
         index[url] = {
             'id': summary_id,
@@ -142,8 +259,9 @@ class SummaryStorage:
             'timestamp_unix': timestamp_unix,
             'preview': preview
         }
+        self._id_to_url[summary_id] = url
         
-        self._save_index(index)
+        self._mark_dirty(url, index[url])
         
         return summary_id
     
@@ -199,15 +317,11 @@ class SummaryStorage:
             摘要信息字典，包含'id'、'url'、'timestamp'、'content'等字段，
             如果未找到则返回None
         """
-        # 加载索引
-        index = self._load_index()
+        # 加载索引(同时刷新ID到URL的反向索引)
+        self._load_index()
         
         # 查找对应ID的URL
-        target_url = None
-        for url, metadata in index.items():
-            if metadata['id'] == summary_id:
-                target_url = url
-                break
+        target_url = self._id_to_url.get(summary_id)
         
         if not target_url:
             return None
@@ -254,27 +368,12 @@ class SummaryStorage:
         index = self._load_index()
         
         # 确定是URL还是ID
-        is_id = True
-        for stored_url, metadata in index.items():
-            if stored_url == url_or_id:
-                # 这是一个URL
-                is_id = False
-                break
-        
-        if is_id:
-            # 找对应ID的URL
-            target_url = None
-            for url, metadata in index.items():
-                if metadata['id'] == url_or_id:
-                    target_url = url
-                    break
-            
-            if not target_url:
-                return False
-            
-            url = target_url
-        else:
+        if url_or_id in index:
             url = url_or_id
+        else:
+            url = self._id_to_url.get(url_or_id)
+            if not url:
+                return False
         
         # 检查URL是否存在
         if url not in index:
@@ -291,6 +390,7 @@ class SummaryStorage:
         
         # 更新索引
         del index[url]
-        self._save_index(index)
+        self._id_to_url.pop(summary_id, None)
+        self._mark_dirty(url, None)
         
         return True
\ No newline at end of file
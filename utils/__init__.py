@@ -11,8 +11,11 @@ from .text_utils import (
     estimate_tokens, 
     validate_url,
     get_domain_from_url,
-    extract_main_content
+    extract_main_content,
+    get_encoder
 )
+from .rate_limiter import AsyncRateLimiter
+from .json_utils import json_loads, json_dumps
 
 __all__ = [
     'clean_html',
@@ -22,5 +25,9 @@ __all__ = [
     'estimate_tokens',
     'validate_url',
     'get_domain_from_url',
-    'extract_main_content'
+    'extract_main_content',
+    'get_encoder',
+    'AsyncRateLimiter',
+    'json_loads',
+    'json_dumps'
 ]
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+JSON序列化工具模块，优先使用orjson加速读写，未安装时退回到标准库json。
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    解析JSON数据
+    
+    Args:
+        data: JSON文本或UTF-8编码的字节串
+    
+    Returns:
+        解析得到的Python对象
+    
+    Raises:
+        json.JSONDecodeError: 数据不是合法的JSON(orjson的异常是其子类)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    将对象序列化为UTF-8编码的JSON字节串，非ASCII字符按原样输出
+    
+    Args:
+        obj: 要序列化的对象
+        indent: 是否使用2个空格缩进
+    
+    Returns:
+        JSON字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
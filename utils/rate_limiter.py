@@ -0,0 +1,85 @@
+"""
+异步限流工具模块，用于控制对LLM API的并发数和请求速率。
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class AsyncRateLimiter:
+    """
+    异步限流器，组合并发上限(信号量)与令牌桶速率限制
+    
+    用法:
+        limiter = AsyncRateLimiter(max_rate=500, time_period=60, max_concurrency=20)
+        async with limiter:
+            await call_api()
+    """
+    
+    def __init__(self, max_rate: float, time_period: float = 60, max_concurrency: Optional[int] = None):
+        """
+        初始化限流器
+        
+        Args:
+            max_rate: 每个时间窗口内允许的最大请求数
+            time_period: 时间窗口长度(秒)
+            max_concurrency: 最大并发请求数，为None时不限制并发
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self.max_concurrency = max_concurrency
+        self._tokens = float(max_rate)
+        self._last_refill = time.monotonic()
+        
+        # asyncio原语延迟到首次使用时创建，确保绑定到正在运行的事件循环；
+        # 事件循环变化(如多次调用asyncio.run)时重新创建
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _ensure_primitives(self):
+        """为当前运行的事件循环创建asyncio同步原语(如果尚未创建)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+    
+    def _refill(self):
+        """按经过的时间补充令牌"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.max_rate, self._tokens + elapsed * self.max_rate / self.time_period)
+    
+    async def acquire(self):
+        """获取一个并发名额和一个速率令牌，必要时等待"""
+        self._ensure_primitives()
+        if self._semaphore:
+            await self._semaphore.acquire()
+        
+        try:
+            async with self._lock:
+                while True:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    # 等待到下一个令牌生成
+                    await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+        except BaseException:
+            if self._semaphore:
+                self._semaphore.release()
+            raise
+    
+    def release(self):
+        """释放并发名额"""
+        if self._semaphore:
+            self._semaphore.release()
+    
+    async def __aenter__(self) -> "AsyncRateLimiter":
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
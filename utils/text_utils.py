@@ -3,18 +3,87 @@
 文本处理工具模块，提供各种文本处理和分析功能。
 """
 import re
+import html
+import functools
 import unicodedata
 import urllib.parse
 from typing import List, Optional, Tuple, Dict, Any
 from pathlib import Path
 from urllib.parse import urlparse
 import tiktoken
+from lxml import etree
+from lxml import html as lxml_html
+
+
+# 预编译的正则表达式
+_SCRIPT_RE = re.compile(r'<script[^>]*>[\s\S]*?</script>')
+_STYLE_RE = re.compile(r'<style[^>]*>[\s\S]*?</style>')
+_TAG_RE = re.compile(r'<[^>]*>')
+_WHITESPACE_RE = re.compile(r'\s+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+_SENTENCE_END_CHARS = frozenset('.!?。！？')
+_SENTENCE_SPLIT_RE = re.compile(r'([.!?。！？；;])\s*')
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+_HTML_CLOSE_RE = re.compile(r'</(?:html|body)\s*>', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4)
+def get_encoder(name: str = "cl100k_base") -> tiktoken.Encoding:
+    """
+    获取tiktoken编码器，构建编码器开销较大，因此在进程内缓存复用
+    
+    Args:
+        name: 编码器名称
+    
+    Returns:
+        tiktoken编码器
+    """
+    try:
+        return tiktoken.get_encoding(name)
+    except:
+        # 降级方案，使用基础编码器
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
 
 
 def clean_html(html_text: str) -> str:
     """
     清理HTML文本，移除HTML标签
     
+    Args:
+        html_text: 包含HTML标签的文本
+    
+    Returns:
+        清理后的纯文本
+    """
+    # 使用lxml(libxml2)解析，比正则逐段替换更快，也能正确处理注释和CDATA。
+    # libxml2会丢弃</html>之后的内容，因此先去掉</body>和</html>；
+    # huge_tree解除默认的嵌套深度限制，否则嵌套过深的文档会得到空树
+    try:
+        root = lxml_html.fromstring(
+            _HTML_CLOSE_RE.sub(' ', html_text),
+            parser=lxml_html.HTMLParser(huge_tree=True)
+        )
+    except (etree.ParserError, ValueError):
+        # 空文档或带编码声明的字符串无法解析，退回到正则方案
+        return _clean_html_by_regex(html_text)
+    
+    # 清空脚本和样式的内容，保留其后的文本(注释内容本身不会被itertext输出)
+    for element in list(root.iter('script', 'style')):
+        element.clear(keep_tail=True)
+    
+    # 各文本节点之间以空格分隔，避免相邻标签中的文字粘连；实体已由解析器解码
+    text = normalize_whitespace(' '.join(root.itertext()))
+    
+    # lxml对异常文档可能不报错而返回空结果，此时同样退回到正则方案
+    if not text:
+        return _clean_html_by_regex(html_text)
+    return text
+
+
+def _clean_html_by_regex(html_text: str) -> str:
+    """
+    使用正则表达式清理HTML文本，作为lxml无法解析时的降级方案
+    
     Args:
         html_text: 包含HTML标签的文本
     
@@ -22,22 +91,16 @@ def clean_html(html_text: str) -> str:
         清理后的纯文本
     """
     # 移除脚本标签和内容
-    html_text = re.sub(r'<script[^>]*>[\s\S]*?</script>', ' ', html_text)
+    html_text = _SCRIPT_RE.sub(' ', html_text)
     
     # 移除样式标签和内容
-    html_text = re.sub(r'<style[^>]*>[\s\S]*?</style>', ' ', html_text)
+    html_text = _STYLE_RE.sub(' ', html_text)
     
     # 移除其他HTML标签
-    html_text = re.sub(r'<[^>]*>', ' ', html_text)
+    html_text = _TAG_RE.sub(' ', html_text)
     
-    # 处理HTML实体
-    html_text = re.sub(r'&nbsp;', ' ', html_text)
-    html_text = re.sub(r'&lt;', '<', html_text)
-    html_text = re.sub(r'&gt;', '>', html_text)
-    html_text = re.sub(r'&amp;', '&', html_text)
-    html_text = re.sub(r'&quot;', '"', html_text)
-    html_text = re.sub(r'&#39;', "'", html_text)
-    html_text = re.sub(r'&[a-zA-Z0-9]+;', ' ', html_text)  # 其他HTML实体
+    # 一次遍历解码所有命名和数字HTML实体(&nbsp;解码为不换行空格，随后按空白处理)
+    html_text = html.unescape(html_text)
     
     return normalize_whitespace(html_text)
 
@@ -53,10 +116,10 @@ def normalize_whitespace(text: str) -> str:
         规范化后的文本
     """
     # 替换连续的空白为单个空格
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     
     # 替换连续多个空行为双空行
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = _BLANK_LINES_RE.sub('\n\n', text)
     
     # 去除前后空白
     return text.strip()
@@ -73,10 +136,10 @@ def extract_main_content(text: str) -> str:
         提取的主要内容
     """
     # 分割文本为段落
-    paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+    paragraphs = [p for p in map(str.strip, text.split('\n')) if p]
     
-    # 过滤太短的段落(可能是菜单、导航等)
-    main_paragraphs = [p for p in paragraphs if len(p) > 40 or re.search(r'[.!?。！？]', p)]
+    # 过滤太短的段落(可能是菜单、导航等)，用集合判断是否含句末标点
+    main_paragraphs = [p for p in paragraphs if len(p) > 40 or not _SENTENCE_END_CHARS.isdisjoint(p)]
     
     # 如果过滤后的段落太少，则退回到原始段落
     if len(main_paragraphs) < len(paragraphs) * 0.3:
@@ -97,19 +160,38 @@ def estimate_tokens(text: str) -> int:
     """
     try:
         # 尝试使用tiktoken
-        tokenizer = tiktoken.get_encoding("cl100k_base")
+        tokenizer = get_encoder("cl100k_base")
         return len(tokenizer.encode(text))
     except:
         # 降级方案：使用简单估计
         # 按照OpenAI的估算，英文每4个字符约1个token，中文每1个字约2个token
-        english_chars = sum(1 for c in text if ord(c) < 128)
-        chinese_chars = sum(1 for c in text if ord(c) >= 0x4E00 and ord(c) <= 0x9FFF)
+        # 计数均在C层完成，避免逐字符的Python循环
+        english_chars = len(text.encode('ascii', 'ignore'))
+        chinese_chars = len(text) - len(_CJK_RE.sub('', text))
         other_chars = len(text) - english_chars - chinese_chars
         
         tokens_estimate = (english_chars / 4) + (chinese_chars * 2) + (other_chars / 3)
         return int(tokens_estimate)
 
 
+def _estimate_tokens_batch(texts: List[str]) -> List[int]:
+    """
+    批量估计多段文本的token数量，一次调用编码器完成所有文本的编码
+    
+    Args:
+        texts: 文本列表
+    
+    Returns:
+        与texts一一对应的估计token数列表
+    """
+    try:
+        tokenizer = get_encoder("cl100k_base")
+        return [len(tokens) for tokens in tokenizer.encode_ordinary_batch(texts)]
+    except:
+        # 降级方案：逐段使用简单估计
+        return [estimate_tokens(text) for text in texts]
+
+
 def split_text_by_tokens(
     text: str, 
     max_tokens_per_chunk: int = 2000, 
@@ -127,7 +209,7 @@ def split_text_by_tokens(
         分割后的文本块列表
     """
     try:
-        tokenizer = tiktoken.get_encoding("cl100k_base")
+        tokenizer = get_encoder("cl100k_base")
         tokens = tokenizer.encode(text)
         
         # 分割tokens
@@ -166,8 +248,7 @@ def split_text_by_paragraphs(
     current_chunk = []
     current_chunk_tokens = 0
     
-    for para in paragraphs:
-        para_tokens = estimate_tokens(para)
+    for para, para_tokens in zip(paragraphs, _estimate_tokens_batch(paragraphs)):
         
         # 如果一个段落太大，需要进一步分割
         if para_tokens > max_tokens_per_chunk:
@@ -181,8 +262,7 @@ def split_text_by_paragraphs(
             temp_chunk = []
             temp_tokens = 0
             
-            for sentence in sentences:
-                sentence_tokens = estimate_tokens(sentence)
+            for sentence, sentence_tokens in zip(sentences, _estimate_tokens_batch(sentences)):
                 if temp_tokens + sentence_tokens > max_tokens_per_chunk:
                     if temp_chunk:
                         chunks.append(' '.join(temp_chunk))
@@ -222,7 +302,7 @@ def split_text_by_sentences(text: str) -> List[str]:
         句子列表
     """
     # 处理英文和中文标点
-    text = re.sub(r'([.!?。！？；;])\s*', r'\1\n', text)
+    text = _SENTENCE_SPLIT_RE.sub(r'\1\n', text)
     sentences = [s.strip() for s in text.split('\n') if s.strip()]
     return sentences
 
@@ -2,37 +2,66 @@
 """
 网页内容获取模块，负责抓取和处理网页内容。
 """
+import os
+import asyncio
+import hashlib
+import threading
+import multiprocessing
 import requests
-import time
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Union
 from urllib.parse import urlparse
 import re
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser, LexborNode, SelectolaxError
 import logging
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 连续多行空白
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+# 超长的行(连同其后的换行符)，可能是未处理的代码或其他非正常内容
+_LONG_LINE_RE = re.compile(r'^.{1000,}$\n?', re.MULTILINE)
+
 
 class WebpageContentFetcher:
     """
     网页内容获取工具，用于抓取和清理网页内容
     """
     
+    # 可能是导航、页眉、页脚、广告等的元素，合并为一个选择器，一次遍历即可全部匹配
+    _UNWANTED_SELECTOR = ', '.join([
+        'header', 'footer', 'nav',
+        '.header', '.footer', '.nav', '.navigation', '.menu',
+        '.sidebar', '.advertisement', '.ads', '.ad',
+        '#header', '#footer', '#nav', '#sidebar', '#menu',
+        '[class*="cookie"]', '[class*="banner"]', '[class*="popup"]',
+        '[id*="cookie"]', '[id*="banner"]', '[id*="popup"]'
+    ])
+    
     def __init__(self, 
                  timeout: int = 30, 
                  max_retries: int = 3, 
                  retry_wait: int = 2,
-                 user_agent: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"):
+                 user_agent: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+                 pool_maxsize: int = 64,
+                 cache_size: int = 256,
+                 max_content_bytes: int = 5 * 1024 * 1024):
         """
         初始化网页内容获取器
         
         Args:
             timeout: 请求超时时间(秒)
-            max_retries: 最大重试次数
-            retry_wait: 重试等待时间(秒)
+            max_retries: 最大尝试次数(包括首次请求)
+            retry_wait: 重试等待的退避系数(秒)。第1次重试立即进行，之后第n次重试前等待
+                retry_wait * 2**(n-1)秒；服务器返回Retry-After时以其为准
             user_agent: 请求使用的User-Agent
+            pool_maxsize: 每个主机保持的最大连接数，并发抓取同一站点时复用连接
+            cache_size: 缓存验证信息和处理结果的最大URL数
+            max_content_bytes: 单个网页最多读取的字节数，超出部分被截断
         """
         self.timeout = timeout
         self.max_retries = max_retries
@@ -46,6 +75,32 @@ class WebpageContentFetcher:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         })
+        
+        # 连接池与重试由urllib3负责：同一主机的请求复用连接，
+        # 连接错误、超时及临时性的服务端错误按指数退避自动重试
+        adapter = HTTPAdapter(
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                # total为重试次数，不含首次请求
+                total=max(max_retries - 1, 0),
+                backoff_factor=retry_wait,
+                status_forcelist=[429, 500, 502, 503, 504],
+                respect_retry_after_header=True
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # 按URL缓存(ETag, Last-Modified, HTML哈希, 处理后的内容)。再次获取时发送条件请求，
+        # 服务器返回304或HTML未变化时直接使用缓存内容，跳过解析
+        self.cache_size = cache_size
+        self.max_content_bytes = max_content_bytes
+        self._page_cache: Dict[str, Tuple[Optional[str], Optional[str], str, str]] = {}
+        self._page_cache_lock = threading.Lock()
+        
+        # 批量获取时解析HTML的进程池，首次使用时创建，之后复用
+        self._process_pool: Optional[ProcessPoolExecutor] = None
     
     def fetch(self, url: str) -> str:
         """
@@ -58,7 +113,33 @@ class WebpageContentFetcher:
             处理后的网页内容文本
         
         Raises:
-            ValueError: URL无效
+            ValueError: URL无效或响应不是HTML
+            ConnectionError: 连接错误
+            TimeoutError: 请求超时
+            Exception: 其他错误
+        """
+        html_content, cache_entry = self._download(url)
+        if html_content is None:
+            return cache_entry[3]
+        
+        processed_content = self._process_content(html_content, url)
+        self._cache_page(url, cache_entry[:3] + (processed_content,))
+        return processed_content
+    
+    def _download(self, url: str) -> Tuple[Optional[str], Tuple[Optional[str], Optional[str], str, Optional[str]]]:
+        """
+        以流式读取下载网页，最多读取max_content_bytes字节；
+        页面未修改或HTML与上次相同时直接取缓存的处理结果
+        
+        Args:
+            url: 网页URL
+        
+        Returns:
+            (HTML内容, 缓存条目)。缓存条目为(ETag, Last-Modified, HTML哈希, 处理后的内容)；
+            可使用缓存时HTML内容为None，否则缓存条目中处理后的内容为None，需由调用方处理HTML
+        
+        Raises:
+            ValueError: URL无效或响应不是HTML
             ConnectionError: 连接错误
             TimeoutError: 请求超时
             Exception: 其他错误
@@ -67,42 +148,168 @@ class WebpageContentFetcher:
         if not self._is_valid_url(url):
             raise ValueError(f"无效的URL: {url}")
         
-        # 尝试获取内容
-        html_content = None
-        last_error = None
-        
-        for attempt in range(self.max_retries):
-            try:
-                logger.info(f"正在获取网页 {url}，尝试 {attempt + 1}/{self.max_retries}")
-                response = self.session.get(url, timeout=self.timeout, allow_redirects=True)
+        # 已缓存的页面发送条件请求
+        cached = self._page_cache.get(url)
+        headers = {}
+        if cached:
+            etag, last_modified = cached[0], cached[1]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        # 获取内容(重试由会话的HTTPAdapter处理)
+        try:
+            logger.info(f"正在获取网页 {url}")
+            with self.session.get(url, timeout=self.timeout, allow_redirects=True,
+                                  headers=headers, stream=True) as response:
+                if response.status_code == 304 and cached:
+                    logger.info(f"网页未修改，使用缓存内容 {url}")
+                    return None, cached
                 response.raise_for_status()
-                html_content = response.text
-                break
-            except requests.exceptions.Timeout as e:
-                logger.warning(f"请求超时: {str(e)}")
-                last_error = TimeoutError(f"请求超时: {str(e)}")
-                time.sleep(self.retry_wait)
-            except requests.exceptions.ConnectionError as e:
-                logger.warning(f"连接错误: {str(e)}")
-                last_error = ConnectionError(f"连接错误: {str(e)}")
-                time.sleep(self.retry_wait)
-            except requests.exceptions.HTTPError as e:
-                logger.warning(f"HTTP错误: {str(e)}")
-                last_error = Exception(f"HTTP错误: {str(e)}")
-                time.sleep(self.retry_wait)
-            except Exception as e:
-                logger.warning(f"获取网页内容时出现未知错误: {str(e)}")
-                last_error = Exception(f"获取网页内容时出现未知错误: {str(e)}")
-                time.sleep(self.retry_wait)
+                
+                # 非HTML内容(如视频、压缩包)不下载正文
+                content_type = response.headers.get('Content-Type', 'text/html').lower()
+                if not content_type.startswith(('text/html', 'application/xhtml+xml')):
+                    raise ValueError(f"不支持的内容类型: {content_type}")
+                
+                # 分块读取，超过上限时截断并关闭连接
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(65536):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= self.max_content_bytes:
+                        logger.warning(f"网页内容超过{self.max_content_bytes}字节，已截断: {url}")
+                        break
+                content = b''.join(chunks)[:self.max_content_bytes]
+                encoding = response.encoding or 'utf-8'
+        except ValueError as e:
+            logger.warning(str(e))
+            raise
+        except requests.exceptions.Timeout as e:
+            logger.warning(f"请求超时: {str(e)}")
+            raise TimeoutError(f"请求超时: {str(e)}")
+        except (requests.exceptions.HTTPError, requests.exceptions.RetryError) as e:
+            logger.warning(f"HTTP错误: {str(e)}")
+            raise Exception(f"HTTP错误: {str(e)}")
+        except requests.exceptions.ConnectionError as e:
+            logger.warning(f"连接错误: {str(e)}")
+            raise ConnectionError(f"连接错误: {str(e)}")
+        except Exception as e:
+            logger.warning(f"获取网页内容时出现未知错误: {str(e)}")
+            raise Exception(f"获取网页内容时出现未知错误: {str(e)}")
+        
+        # HTML与上次获取的相同时跳过处理，只更新验证信息
+        html_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if cached and cached[2] == html_hash:
+            cache_entry = (etag, last_modified, html_hash, cached[3])
+            self._cache_page(url, cache_entry)
+            return None, cache_entry
+        
+        try:
+            html_content = content.decode(encoding, errors='replace')
+        except LookupError:
+            html_content = content.decode('utf-8', errors='replace')
+        return html_content, (etag, last_modified, html_hash, None)
+    
+    def _cache_page(self, url: str, entry: Tuple[Optional[str], Optional[str], str, str]):
+        """
+        缓存页面的验证信息和处理结果，超过cache_size时淘汰最早缓存的URL
+        
+        Args:
+            url: 网页URL
+            entry: 缓存条目，(ETag, Last-Modified, HTML哈希, 处理后的内容)
+        """
+        if self.cache_size <= 0:
+            return
+        with self._page_cache_lock:
+            self._page_cache.pop(url, None)
+            while len(self._page_cache) >= self.cache_size:
+                del self._page_cache[next(iter(self._page_cache))]
+            self._page_cache[url] = entry
+    
+    async def afetch(self, url: str) -> str:
+        """
+        异步获取网页内容，请求和HTML解析在线程中执行，不阻塞事件循环
+        
+        Args:
+            url: 网页URL
+        
+        Returns:
+            处理后的网页内容文本
         
+        Raises:
+            与fetch相同
+        """
+        return await self._afetch(url)
+    
+    async def _afetch(self, url: str, executor: Optional[Executor] = None) -> str:
+        """
+        异步获取网页内容，HTML解析在指定的执行器中进行
+        
+        Args:
+            url: 网页URL
+            executor: 执行HTML解析的执行器，为None时使用默认线程池
+        
+        Returns:
+            处理后的网页内容文本
+        """
+        html_content, cache_entry = await asyncio.to_thread(self._download, url)
         if html_content is None:
-            if last_error:
-                raise last_error
-            else:
-                raise Exception(f"无法获取网页内容: {url}")
+            return cache_entry[3]
+        
+        loop = asyncio.get_running_loop()
+        processed_content = await loop.run_in_executor(executor, self._process_content, html_content, url)
+        self._cache_page(url, cache_entry[:3] + (processed_content,))
+        return processed_content
+    
+    async def fetch_many(self, urls: List[str], concurrency: int = 32) -> List[Union[str, Exception]]:
+        """
+        并发获取多个网页的内容，HTML解析在进程池中进行以利用多核。
+        工作进程不通过fork创建，调用方脚本的入口代码需放在if __name__ == "__main__"之下
+        
+        Args:
+            urls: 网页URL列表
+            concurrency: 最大并发请求数
+        
+        Returns:
+            与urls一一对应的结果列表，成功时为网页内容文本，失败时为对应的异常
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        # HTML解析是CPU密集型操作，线程中执行会受GIL限制，批量获取时交给进程池
+        executor = self._get_process_pool()
+        
+        async def fetch_one(url: str) -> str:
+            async with semaphore:
+                return await self._afetch(url, executor)
+        
+        return await asyncio.gather(*(fetch_one(url) for url in urls), return_exceptions=True)
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        获取解析HTML的进程池(如果尚未创建则创建)
         
-        # 处理内容
-        return self._process_content(html_content, url)
+        Returns:
+            进程池
+        """
+        if self._process_pool is None:
+            # 创建工作进程时可能有下载线程正持有urllib3和logging的锁，
+            # 在多线程进程中fork可能死锁，因此使用forkserver(不支持时使用spawn)启动工作进程
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return self._process_pool
+    
+    def close(self):
+        """关闭解析HTML的进程池，之后再批量获取时会重新创建"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
     
     def _is_valid_url(self, url: str) -> bool:
         """
@@ -120,9 +327,10 @@ class WebpageContentFetcher:
         except:
             return False
     
-    def _process_content(self, html_content: str, url: str) -> str:
+    @classmethod
+    def _process_content(cls, html_content: str, url: str) -> str:
         """
-        处理HTML内容，提取主要文本
+        处理HTML内容，提取主要文本。不依赖实例状态，可提交到进程池执行
         
         Args:
             html_content: 原始HTML内容
@@ -131,21 +339,17 @@ class WebpageContentFetcher:
         Returns:
             处理后的文本内容
         """
-        # 使用BeautifulSoup解析HTML
-        try:
-            soup = BeautifulSoup(html_content, 'lxml')  # 使用lxml解析器
-        except:
-            # 降级到html.parser
-            soup = BeautifulSoup(html_content, 'html.parser')
+        # 使用Lexbor(C实现的HTML5解析器)解析HTML
+        tree = LexborHTMLParser(html_content)
         
         # 删除不需要的元素
-        self._remove_unwanted_elements(soup)
+        cls._remove_unwanted_elements(tree)
         
         # 获取标题
-        title = self._get_title(soup)
+        title = cls._get_title(tree)
         
         # 获取主要内容
-        main_content = self._extract_main_content(soup, url)
+        main_content = cls._extract_main_content(tree, url)
         
         # 组合内容
         if title:
@@ -155,60 +359,65 @@ class WebpageContentFetcher:
         
         return processed_content
     
-    def _remove_unwanted_elements(self, soup: BeautifulSoup):
+    @staticmethod
+    def _get_text(node: LexborNode) -> str:
         """
-        从BeautifulSoup对象中删除不需要的元素
+        提取节点下的全部文本，每个文本节点去除首尾空白后按行拼接，跳过空白节点
         
         Args:
-            soup: BeautifulSoup对象
+            node: 文档节点
+        
+        Returns:
+            文本内容
         """
-        # 删除脚本和样式
-        for element in soup(['script', 'style', 'iframe', 'noscript', 'head', 'meta', 'link']):
-            element.decompose()
+        # 先以NUL分隔取出所有文本(HTML解析时NUL已被替换，不会出现在文本中)，再过滤空串
+        return '\n'.join(filter(None, node.text(separator='\0', strip=True).split('\0')))
+    
+    @classmethod
+    def _remove_unwanted_elements(cls, tree: LexborHTMLParser):
+        """
+        从文档树中删除不需要的元素
         
-        # 删除可能是导航、页眉、页脚、广告等的元素
-        selectors = [
-            'header', 'footer', 'nav',
-            '.header', '.footer', '.nav', '.navigation', '.menu',
-            '.sidebar', '.advertisement', '.ads', '.ad',
-            '#header', '#footer', '#nav', '#sidebar', '#menu',
-            '[class*="cookie"]', '[class*="banner"]', '[class*="popup"]',
-            '[id*="cookie"]', '[id*="banner"]', '[id*="popup"]'
-        ]
+        Args:
+            tree: 解析后的文档树
+        """
+        # 删除脚本和样式
+        tree.strip_tags(['script', 'style', 'iframe', 'noscript', 'head', 'meta', 'link'])
         
-        for selector in selectors:
-            try:
-                for element in soup.select(selector):
-                    element.decompose()
-            except:
-                pass
+        # 删除可能是导航、页眉、页脚、广告等的元素。匹配结果按文档顺序排列，
+        # 嵌套时祖先在前，逆序删除可保证先删除后代，不会访问已释放的节点
+        for element in reversed(tree.css(cls._UNWANTED_SELECTOR)):
+            element.decompose()
     
-    def _get_title(self, soup: BeautifulSoup) -> str:
+    @staticmethod
+    def _get_title(tree: LexborHTMLParser) -> str:
         """
-        从BeautifulSoup对象中提取标题
+        从文档树中提取标题
         
         Args:
-            soup: BeautifulSoup对象
+            tree: 解析后的文档树
         
         Returns:
             网页标题
         """
-        if soup.title and soup.title.string:
-            return soup.title.string.strip()
+        title = tree.css_first('title')
+        if title and title.text().strip():
+            return title.text().strip()
         
         # 尝试其他标题元素
-        h1 = soup.find('h1')
-        if h1 and h1.text:
-            return h1.text.strip()
+        h1 = tree.css_first('h1')
+        if h1 and h1.text():
+            return h1.text().strip()
         
         return ""
     
-    def _extract_main_content(self, soup: BeautifulSoup, url: str) -> str:
+    @classmethod
+    def _extract_main_content(cls, tree: LexborHTMLParser, url: str) -> str:
         """
-        从BeautifulSoup对象中提取主要内容
+        从文档树中提取主要内容
         
         Args:
-            soup: BeautifulSoup对象
+            tree: 解析后的文档树
             url: 网页URL，用于特定网站的定制处理
         
         Returns:
@@ -228,27 +437,28 @@ class WebpageContentFetcher:
         main_element = None
         for selector in content_selectors:
             try:
-                elements = soup.select(selector)
+                elements = tree.css(selector)
                 if elements:
-                    # 选择文本量最多的元素
-                    main_element = max(elements, key=lambda e: len(e.text.strip()))
+                    # 选择文本量最多的元素，文本长度按去除各文本节点首尾空白后计算，
+                    # 每个候选元素只提取一次文本
+                    best_len = -1
+                    for element in elements:
+                        text_len = len(element.text(strip=True))
+                        if text_len > best_len:
+                            best_len = text_len
+                            main_element = element
                     break
-            except:
+            except SelectolaxError:
                 continue
         
         if main_element:
-            content = main_element.get_text(separator='\n', strip=True)
+            content = cls._get_text(main_element)
         else:
             # 如果没有找到主要内容容器，则使用整个body
-            content = soup.get_text(separator='\n', strip=True)
+            content = cls._get_text(tree.root) if tree.root else ""
         
         # 去除连续多行空白
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
-        
-        # 去除超长的行（可能是未处理的代码或其他非正常内容）
-        lines = []
-        for line in content.splitlines():
-            if len(line) < 1000:  # 设置一个合理的行长度上限
-                lines.append(line)
+        content = _BLANK_LINES_RE.sub('\n\n', content)
         
-        return '\n'.join(lines)
\ No newline at end of file
+        # 去除超长的行，末行被删除时会留下其前一行的换行符
+        return _LONG_LINE_RE.sub('', content).rstrip('\n')
\ No newline at end of file